@@ -1,10 +1,14 @@
 from typing import List, Dict, Tuple, Optional, Any
 from dataclasses import dataclass
 import pathlib
+import re
 import parse
 
 
-@dataclass
+_RE_LINE_WKT = re.compile(r"/Subj\(Line\).*?/L\[([\d.eE+\- ]+)\]")
+
+
+@dataclass(slots=True)
 class AnnotationProperties:
     line_color: Optional[tuple] = None
     line_opacity: Optional[float] = None
@@ -14,7 +18,7 @@ class AnnotationProperties:
     fill_opacity: Optional[float] = None
         
 
-@dataclass
+@dataclass(slots=True)
 class Annotation:
     object_type: str
     vertices: List[str]
@@ -43,7 +47,6 @@ def extract_wkt_objects(fdf_data: List[str]) -> List[str]:
     """
     wkt_objects = []
     for line in fdf_data:
-        fd
         wkt_object = convert_line_to_wkt(line)
         if wkt_object is not None:
             wkt_objects.append(wkt_object)
@@ -159,27 +162,17 @@ def convert_line_to_wkt(fdf_line: str) -> str:
     """
     Converts 'fdf_line' to a wkt object if applicable.
     """
-    conversion_funcs = [
-        convert_line_object,
-    ]
-    wkt_object = None
-    for conversion_func in conversion_funcs:
-        wkt_object = convert_line_object(fdf_line)
-        if wkt_object is not None:
-            return wkt_object
-    return wkt_object
-    
-    
+    return convert_line_object(fdf_line)
+
+
 def convert_line_object(fdf_line: str) -> str:
     """
     If 'fdf_line' includes a Line object, returns the line
     object convert to a WKT Line object. Returns None otherwise.
     """
-    if "/Subj(Line)" in fdf_line:
-        beg_index = fdf_line.find("/L[")
-        end_index = fdf_line[beg_index:].find("]")
-        coords = fdf_line[beg_index + 3: beg_index + end_index].split(" ")
-        x1, y1, x2, y2 = coords
+    line_object = _RE_LINE_WKT.search(fdf_line)
+    if line_object:
+        x1, y1, x2, y2 = line_object.group(1).split(" ")
         return f"LINESTRING({x1} {y1}, {x2} {y2})"
     
     
@@ -1,16 +1,63 @@
 from typing import List, Dict, Tuple, Optional, Any, Union
 from dataclasses import dataclass
 from matplotlib import pyplot as plt
-from matplotlib.patches import Polygon
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.colors import to_rgba
 # from descartes.patch import PolygonPatch
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import mmap
+import os
 import pathlib
-import parse
+import re
 import numpy as np
-from shapely.wkt import loads
+import shapely
+from shapely.geometry import LineString, Polygon
 from shapely.geometry.base import BaseGeometry
 
 
-@dataclass
+# Precompiled patterns for the tokens of interest in an FDF file. Compiling
+# once at import time keeps the per-line cost in the extraction loop down to
+# a single C-level scan per token. The patterns are byte patterns because the
+# tokens are all 7-bit ASCII, so the file never needs to be decoded; only the
+# captured groups are decoded (or cast to float) on a match.
+# Every token and structural marker in the FDF grammar combined into one
+# alternation. The whole file is scanned with a single finditer pass and
+# matches are dispatched on the named group that fired (match.lastgroup),
+# so all of the pattern matching happens in one C-level sweep of the
+# buffer and the Python side only groups matches by offset order. The
+# structural markers come last so value tokens get first shot, and
+# endstream precedes stream so the longer marker wins.
+_RE_TOKENS = re.compile(
+    rb"obj<</Subj\((?P<subj>[^)]+)\)"
+    rb"|/Vertices\[(?P<vertices>[^\]]+)\]"
+    rb"|/Rect\[(?P<rect>[^\]]+)\]"
+    rb"|/L\[(?P<l>[^\]]+)\]"
+    # The trailing '/' delimiters are lookaheads so one token's delimiter
+    # is not consumed out from under the next token in the same line.
+    rb"|/FillOpacity (?P<fill_opacity>[\d.eE+-]+)(?=/)"
+    rb"|/LineOpacity (?P<line_opacity>[\d.eE+-]+)(?=/)"
+    rb"|/Contents\((?P<label>[^)]*)\)(?=/)"
+    rb"|/Page\((?P<page>[^)]+)\)"
+    rb"|(?P<endstream>endstream)"
+    rb"|(?P<stream>stream)"
+    rb"|(?P<obj>obj<<)"
+)
+
+# Files below this size are slurped with a single os.read; larger ones are
+# memory-mapped so parsing can start without staging the whole file in RAM.
+_MMAP_THRESHOLD = 8 * 1024 * 1024
+# The stream operators (stroke/fill color, line weight, dash pattern)
+# likewise share one alternation so a stream line is scanned once, with
+# match.lastgroup identifying which operator fired.
+_RE_STREAM = re.compile(
+    rb"(?P<r>[\d.eE+-]+) (?P<g>[\d.eE+-]+) (?P<b>[\d.eE+-]+) (?P<color_op>RG|rg)"
+    rb"| (?P<weight>[\d.eE+-]+) w"
+    rb"| \[(?P<dashes>[^\]]*)\] (?P<phase>[\d.eE+-]+) d"
+)
+
+
+@dataclass(slots=True)
 class AnnotationProperties:
     line_color: Optional[tuple] = None
     line_opacity: Optional[float] = None
@@ -20,7 +67,7 @@ class AnnotationProperties:
     fill_opacity: Optional[float] = None
 
         
-@dataclass
+@dataclass(slots=True)
 class Annotation:
     object_type: str
     vertices: List[str]
@@ -29,51 +76,110 @@ class Annotation:
     properties: Optional[AnnotationProperties] = None
     wkt: Optional[str] = None
     geom: Optional[BaseGeometry] = None
+    xy: Optional[np.ndarray] = None
         
         
-def load_annotations(file_path: pathlib.Path) -> list:
+def load_annotations(file_path: pathlib.Path, processes: Optional[int] = None) -> list:
     """
     Loads the annotations in the FDF file found at 'file_path' and returns a list
     of objects determined by 'output'.
+    If 'processes' is given and greater than 1, the FDF data is split into
+    annotation-aligned chunks and parsed across that many worker processes
+    (os.cpu_count() is a reasonable value). Parsing is pure CPU work with no
+    state shared between annotation groups, so large files scale with cores.
     """
-    file_path = pathlib.Path(file_path)
-    fdf_data = read_fdf_file(file_path)
-    bare_annotations = get_annotations_from_fdf(fdf_data)
+    fdf_data = read_fdf_bytes(file_path)
+    try:
+        if processes and processes > 1:
+            chunks = split_fdf_chunks(fdf_data, processes)
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                bare_annotations = [
+                    annotation
+                    for chunk_annotations in executor.map(get_annotations_from_fdf, chunks)
+                    for annotation in chunk_annotations
+                ]
+        else:
+            bare_annotations = get_annotations_from_fdf(fdf_data)
+    finally:
+        if isinstance(fdf_data, mmap.mmap):
+            fdf_data.close()
     complete_annotations = []
+    with_geometry = []
     for annotation in bare_annotations:
-        annotation.wkt = annotation_to_wkt(annotation)
-        annotation.geom = loads(annotation.wkt)
+        # Build the geometry straight from the vertex array; round-tripping
+        # through WKT text would only have shapely re-tokenize a string we
+        # just built.
+        xy = annotation_xy(annotation).T
+        if annotation.object_type in ("Polygon", "Rectangle"):
+            annotation.geom = Polygon(xy)
+        elif annotation.object_type in ("Line", "PolyLine"):
+            annotation.geom = LineString(xy)
+        if annotation.geom is not None:
+            with_geometry.append(annotation)
         complete_annotations.append(annotation)
+    if with_geometry:
+        # Serialize all geometries with one vectorized GEOS call rather than
+        # paying the FFI boundary once per annotation via geom.wkt.
+        geoms = np.array([annotation.geom for annotation in with_geometry], dtype=object)
+        for annotation, wkt in zip(with_geometry, shapely.to_wkt(geoms, rounding_precision=-1)):
+            annotation.wkt = wkt
     return complete_annotations
         
     
-def read_fdf_file(file_path: pathlib.Path) -> List[str]:
+def read_fdf_bytes(file_path: pathlib.Path):
     """
-    Reads the FDF file and returns a list of strings.
+    Returns the contents of the FDF file as a bytes-like object. Small
+    files (the typical case) are read with a single os.read -- one
+    syscall and one allocation, with none of the high-level file object
+    and line buffering overhead; anything over _MMAP_THRESHOLD is
+    memory-mapped instead so parsing can begin without staging the whole
+    file through userspace. The caller owns closing a returned mmap.
     """
-    with open(file_path, 'rb') as file:
-        acc = []
-        for line in file:
-            try:
-                acc.append(line.decode('utf-8'))
-            except:
-                pass
-    return acc
-    
-    
-def get_annotations_from_fdf(fdf_str: str) -> List[Annotation]:
+    fd = os.open(os.fspath(file_path), os.O_RDONLY)
+    try:
+        size = os.fstat(fd).st_size
+        if size < _MMAP_THRESHOLD:
+            return os.read(fd, size)
+        return mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+
+
+def split_fdf_chunks(fdf_data, n_chunks: int) -> List[bytes]:
+    """
+    Splits 'fdf_data' into at most 'n_chunks' chunks, cutting only at an
+    'obj<<' record that follows an 'endstream' marker so that every
+    annotation group (subject record through stream block) lands whole in
+    exactly one chunk. The chunks are plain bytes so they can be shipped
+    to worker processes.
+    """
+    size = len(fdf_data)
+    approx = max(size // n_chunks, 1)
+    bounds = [0]
+    pos = approx
+    while pos < size and len(bounds) < n_chunks:
+        stream_end = fdf_data.find(b"endstream", pos)
+        if stream_end == -1:
+            break
+        cut = fdf_data.find(b"obj<<", stream_end)
+        if cut == -1:
+            break
+        bounds.append(cut)
+        pos = cut + approx
+    bounds.append(size)
+    return [fdf_data[beg:end] for beg, end in zip(bounds, bounds[1:])]
+
+
+def get_annotations_from_fdf(fdf_data) -> List[Annotation]:
     """
     Separates FDF data by objects
     """
     annotations = []
-    in_stream_data = False
-    stream_data = None
-    stream_properties = {}
-    annotation_properties = {}
+    object_properties = {}
     annot_type, vertices = None, None
-    annotation = None
-    
-    # This upcoming for/if/elif block assumes the following:
+    label, page = None, None
+
+    # This upcoming loop assumes the following:
     #   1. The FDF file contains geometric annotations, which we want, combined with
     #      other annotation data (e.g. bounding boxes) that are related to the geometric
     #      annotations but which we do not want.
@@ -81,173 +187,134 @@ def get_annotations_from_fdf(fdf_str: str) -> List[Annotation]:
     #     a) The geometric annotation in 'obj<<' format as an object
     #     b) Some other information in the 'obj<<' format as other objects (bounding boxes, etc.)
     #     c) The stream data that contains many of the geometry's properties
-    #   3. We are going to get the vertices information (geometry) from the 
+    #   3. We are going to get the vertices information (geometry) from the
     #     'obj<<' formatted data and most of its properties from the stream
     #     which means we need to retain the geometric data as we iterate before
     #     we finally get to that object's applicable stream data.
     #  A visual inspection of an FDF file with geometric markup should be able to inform
     #  the general approach taken.
-        
-    for line in fdf_str:
-        if "endstream" in line and stream_data:
-            stream_properties = extract_stream_properties(stream_data)
-            stream_data = None
-        elif in_stream_data == True:
-            stream_data = line
+
+    tokens = {}
+    in_stream_data = False
+    stream_start = 0
+
+    for match in _RE_TOKENS.finditer(fdf_data):
+        kind = match.lastgroup
+        if in_stream_data:
+            # Everything up to the closing marker is stream data; any token
+            # the scan happens to hit inside it is noise.
+            if kind != "endstream":
+                continue
+            stream_data = fdf_data[stream_start:match.start()]
             in_stream_data = False
-            continue
-        elif not parse.search("{} 0 obj<<", line) and "stream" not in line:
-            continue
-        elif "stream" in line:
-            in_stream_data = True
-            continue       
-        type_and_vertices = extract_type_and_vertices(line)
-        object_properties = extract_object_properties(line)
-        
-        if annot_type and vertices and stream_properties:
-            annotation_properties.update(stream_properties)
-            properties = AnnotationProperties(**annotation_properties)
-            annotation = Annotation(
-                object_type=annot_type,
-                vertices=vertices,
-                page=page,
-                label=label,
-                properties=properties
+            line_color, fill_color, line_weight, line_type = (
+                extract_stream_properties(stream_data)
             )
-            stream_properties = {}
-            type_and_vertices = None
-            annotations.append(annotation)
-        elif type_and_vertices:
-            annot_type, vertices = type_and_vertices
-            label = object_properties.pop("label")
-            page = object_properties.pop("page")
-            annotation_properties.update(object_properties)
+            if annot_type and vertices:
+                properties = AnnotationProperties(
+                    line_color=line_color,
+                    fill_color=fill_color,
+                    line_weight=line_weight,
+                    line_type=line_type,
+                    **object_properties
+                )
+                annotation = Annotation(
+                    object_type=annot_type,
+                    vertices=vertices,
+                    page=page,
+                    label=label,
+                    properties=properties
+                )
+                annotations.append(annotation)
+        elif kind in ("obj", "subj", "stream"):
+            # A structural marker closes the record whose tokens have been
+            # accumulating; fold them into the annotation state before
+            # starting the next record.
+            type_and_vertices = extract_type_and_vertices(tokens)
+            if type_and_vertices:
+                annot_type, vertices = type_and_vertices
+                label = tokens.get("label")
+                page = tokens.get("page")
+                if label is not None: label = label.decode('utf-8')
+                if page is not None: page = page.decode('ascii')
+                # A fresh dict per object: accumulating one dict across the
+                # whole file let fields from a previous annotation leak into
+                # the next.
+                object_properties = extract_object_opacity(tokens)
+            tokens = {}
+            if kind == "subj":
+                tokens["subj"] = match.group("subj")
+            elif kind == "stream":
+                stream_start = fdf_data.find(b"\n", match.end()) + 1
+                in_stream_data = True
+        elif kind != "endstream":
+            tokens.setdefault(kind, match.group(kind))
     return annotations
 
         
-def extract_type_and_vertices(line: str) -> Optional[Tuple[str, str]]:
+def extract_type_and_vertices(tokens: dict) -> Optional[Tuple[str, str]]:
     """
     Returns a tuple of two strings representing the annotation type and
-    a string of vertices in the annotation type extracted from 'line',
-    a str of FDF data.
-    If 'line' does not include an annotation with vertices, None is returned.
+    a string of vertices in the annotation type extracted from 'tokens',
+    the dict of raw token captures collected from one line of FDF data.
+    If 'tokens' does not include an annotation with vertices, None is returned.
     """
-    possible_annotation = parse.search("obj<</Subj({})", line)
+    possible_annotation = tokens.get("subj")
     if possible_annotation:
-        annot_type = possible_annotation[0]
+        annot_type = possible_annotation.decode('ascii')
         vertices = None
         if annot_type == "Line":
-            vertices = parse.search("/L[{}]", line)[0]
+            vertices = tokens["l"].decode('ascii')
             return (annot_type, vertices)
         elif annot_type in ("Circle", "PolyLine", "Polygon"):
-            vertices = parse.search("/Vertices[{}]", line)[0]
+            vertices = tokens["vertices"].decode('ascii')
             return (annot_type, vertices)
         elif annot_type in ("Rectangle", "Square"):
-            bbox = parse.search("/Rect[{}]", line)[0]
+            bbox = tokens["rect"].decode('ascii')
             x1, y1, x2, y2 = bbox.split()
             vertices = " ".join([x1,y1, x1, y2, x2, y2, x2, y1])
             return (annot_type, vertices)
 
-        
-def extract_object_properties(line: str) -> Optional[dict]:
-    object_properties = {}
-    object_properties.update(extract_object_opacity(line))
-    object_properties.update(extract_label(line))
-    object_properties.update(extract_page(line))
-    return object_properties
-        
-        
-def extract_object_opacity(line: str) -> Optional[dict]:
-    fill_opacity = parse.search("/FillOpacity {:g}/", line)
-    line_opacity = parse.search("/LineOpacity {:g}/", line)
-    if fill_opacity: fill_opacity = fill_opacity[0]
-    if line_opacity: line_opacity = line_opacity[0]
-    return {"fill_opacity": fill_opacity, "line_opacity": line_opacity}
-
-
-def extract_label(line: str) -> Optional[dict]:
-    label = parse.search("/Contents({})/", line)
-    if label: label = label[0]
-    return {"label": label}
-
-
-def extract_page(line: str) -> Optional[dict]:
-    page = parse.search("/Page({})", line)
-    if page: page = page[0]
-    return {"page": page}
-
 
-def extract_stream_properties(stream_line: str) -> dict:
-    """
-    Returns a dict of properties which are available from the stream data:
-    'line_color', 'fill_color', 'line_weight'.
-    """
-    line_color = parse_line_color(stream_line)
-    fill_color = parse_fill_color(stream_line)
-    line_weight = parse_line_weight(stream_line)
-    line_type = parse_line_type(stream_line)
-    return {
-        "line_color": line_color, 
-        "fill_color": fill_color, 
-        "line_weight": line_weight,
-        "line_type": line_type
-    }
-
-
-def parse_line_color(stream_line: str) -> Tuple[int]:
-    """
-    Returns a tuple representing the parsed line color specification contained
-    within 'stream_line', a line of text representing the FDF data stream.
-    Returns None if no line color data is found in 'stream_line'
-    
-    The returned tuple is in the format of (R, G, B) where each of R, G, B are a float
-    from 0.0 to 1.0
-    """
-    line_color_result = parse.search("{:g} {:g} {:g} RG", stream_line, case_sensitive=True)
-    if line_color_result:
-        return tuple(line_color_result)
-    
-    
-def parse_fill_color(stream_line: str) -> Tuple[int]:
-    """
-    Returns a tuple representing the parsed line color specification contained
-    within 'stream_line', a line of text representing the FDF data stream.
-    Returns None if no fill color data is found in 'stream_line'
-    
-    The returned tuple is in the format of (R, G, B) where each of R, G, B are a float
-    from 0.0 to 1.0
-    """
-    fill_color_result = parse.search("{:g} {:g} {:g} rg", stream_line, case_sensitive=True)
-    if fill_color_result:
-        return tuple(fill_color_result)
+def extract_object_opacity(tokens: dict) -> Optional[dict]:
+    fill_opacity = tokens.get("fill_opacity")
+    line_opacity = tokens.get("line_opacity")
+    if fill_opacity is not None: fill_opacity = float(fill_opacity)
+    if line_opacity is not None: line_opacity = float(line_opacity)
+    return {"fill_opacity": fill_opacity, "line_opacity": line_opacity}
 
-    
-def parse_line_weight(stream_line: str) -> float:
-    """
-    Returns a float representing the parsed line weight specification contained
-    within 'stream_line', a line of text representing the FDF data stream.
-    Returns None if no line weight is found in 'stream_line'
-    
-    The returned value represents a line weight in points (1 point = 1/72 of an inch)
-    """
-    line_weight_result = parse.search(" {:g} w", stream_line, case_sensitive=True)
-    if line_weight_result:
-        return line_weight_result[0]
-    
 
-def parse_line_type(stream_line: str) -> Tuple[float, tuple]:
+@functools.lru_cache(maxsize=8192)
+def extract_stream_properties(stream_line: bytes) -> tuple:
     """
-    Returns a tuple representing the parsed line type specification contained
-    within 'stream_line', a line of text representing the FDF data stream.
-    Returns None if no line type data is found in 'stream_line'
+    Returns a tuple of the properties which are available from the stream data,
+    in the order (line_color, fill_color, line_weight, line_type).
+    Colors are (R, G, B) tuples of floats from 0.0 to 1.0, the weight is in
+    points (1 point = 1/72 of an inch) and the line type is a
+    (phase, dash lengths) tuple; any operator absent from the stream comes
+    back as None. All of the operators are pulled out in one combined-regex
+    scan of the line. FDF files tend to repeat the same stream data for
+    annotations that share a style, so the result is memoized on the
+    (immutable) bytes line and repeated streams cost a dict lookup instead
+    of a scan.
     """
-    line_type_data = parse.search(" [{}] {:g} d", stream_line)
-    if line_type_data:
-        acc = []
-        for line in line_type_data[0].split(" "):
-            acc.append(float(line))
-        line_type = (line_type_data[1], tuple(acc))
-        return line_type
+    line_color = fill_color = line_weight = line_type = None
+    for match in _RE_STREAM.finditer(stream_line):
+        kind = match.lastgroup
+        if kind == "color_op":
+            color = (float(match["r"]), float(match["g"]), float(match["b"]))
+            if match["color_op"] == b"RG":
+                if line_color is None:
+                    line_color = color
+            elif fill_color is None:
+                fill_color = color
+        elif kind == "weight":
+            if line_weight is None:
+                line_weight = float(match["weight"])
+        elif kind == "phase" and line_type is None:
+            dashes = np.fromstring(match["dashes"], dtype=np.float64, sep=" ")
+            line_type = (float(match["phase"]), tuple(dashes.tolist()))
+    return (line_color, fill_color, line_weight, line_type)
     
     
 def scale_object(annot: Annotation, scale: float) -> str:
@@ -275,64 +342,92 @@ def group_vertices(vertices: str, close = False) -> List[str]:
     Returns a list of (x, y) tuples from a string of vertices in the format of:
     'x1 y1 x2 y2 x3 y3 ... xn yn'
     """
-    acc = []
-    coordinates = []
-    for idx, ordinate in enumerate(vertices.split(" ")):
-        if idx % 2:
-            coordinates.append(ordinate)
-            acc.append(" ".join(coordinates))
-            coordinates = []
-        else:
-            coordinates.append(ordinate)
+    ordinates = vertices.split(" ")
+    acc = [f"{x} {y}" for x, y in zip(ordinates[0::2], ordinates[1::2])]
     if close:
         acc.append(acc[0])
     return ", ".join(acc)
 
-def xy_vertices(vertices: str, close = False) -> List[List[float]]:
+def xy_vertices(vertices: str, close = False) -> np.ndarray:
     """
-    Returns a list of lists of floats to emulate a 2d numpy array of x, y values
+    Returns a (2, n) numpy array of the x and y values in 'vertices'.
+    The float parsing happens inside numpy's C parser rather than one
+    float() call per ordinate.
     """
-    x = []
-    y = []
-    for idx, ordinate in enumerate(vertices.split(" ")):
-        if idx % 2:
-            y.append(float(ordinate))
-        else:
-            x.append(float(ordinate))
-    return np.asarray([x, y])
+    return np.fromstring(vertices, dtype=np.float64, sep=" ").reshape(-1, 2).T
+
+
+def annotation_xy(annot: Annotation) -> np.ndarray:
+    """
+    Returns the (2, n) vertex array for 'annot', parsing the vertex string
+    on first use and caching the array on the instance so plotting and
+    geometry construction do not re-parse the same string.
+    """
+    if annot.xy is None:
+        annot.xy = xy_vertices(annot.vertices)
+    return annot.xy
+
+
+def annotation_color(color: Optional[tuple], alpha: Optional[float]) -> Union[str, tuple]:
+    """
+    Returns an RGBA tuple for 'color' with 'alpha' baked in. A collection
+    draws all of its members in one pass so each member's opacity has to
+    travel in its RGBA value rather than in a per-artist alpha.
+    A color of None maps to "none" (not drawn).
+    """
+    if color is None:
+        return "none"
+    return to_rgba(color, alpha)
 
 
 def plot_annotations(annots: List[Annotation], size: Optional[float], dpi: Optional[float]) -> None:
     """
-    Plots annotations with matplotlib
+    Plots annotations with matplotlib.
+    All polygons are drawn as a single PolyCollection and all lines as a
+    single LineCollection so matplotlib pays its per-artist overhead twice
+    in total instead of once per annotation.
     """
     fig, ax = plt.subplots()
-    for idx, annot in enumerate(annots):
+    poly_verts, poly_face_colors, poly_edge_colors = [], [], []
+    poly_line_weights, poly_line_types = [], []
+    line_verts, line_colors, line_weights, line_types = [], [], [], []
+    for annot in annots:
+        properties = annot.properties
+        xy = annotation_xy(annot)
         if annot.object_type == "Polygon" or annot.object_type == "Rectangle":
-            xy = xy_vertices(annot.vertices)
-            ax.add_patch(
-                Polygon(
-                    xy=xy.T,
-                    closed=True,
-                    linestyle=annot.properties.line_type,
-                    linewidth=annot.properties.line_weight,
-                    ec=annot.properties.line_color,
-                    fc=annot.properties.fill_color,
-                    alpha=annot.properties.fill_opacity,
-                    zorder=idx,
-                )
-            )
+            poly_verts.append(xy.T)
+            poly_face_colors.append(annotation_color(properties.fill_color, properties.fill_opacity))
+            poly_edge_colors.append(annotation_color(properties.line_color, properties.fill_opacity))
+            poly_line_weights.append(properties.line_weight or 1.0)
+            poly_line_types.append(properties.line_type or "solid")
         elif annot.object_type == "Line" or annot.object_type == "PolyLine":
-            xy = xy_vertices(annot.vertices)
-            ax.plot(
-                xy[0],
-                xy[1],
-                linestyle=annot.properties.line_type,
-                linewidth=annot.properties.line_weight,
-                color = annot.properties.line_color,
-                alpha = annot.properties.line_opacity,
-                zorder=idx
+            line_verts.append(xy.T)
+            line_colors.append(annotation_color(properties.line_color, properties.line_opacity))
+            line_weights.append(properties.line_weight or 1.0)
+            line_types.append(properties.line_type or "solid")
+
+    if poly_verts:
+        ax.add_collection(
+            PolyCollection(
+                poly_verts,
+                closed=True,
+                facecolors=poly_face_colors,
+                edgecolors=poly_edge_colors,
+                linewidths=poly_line_weights,
+                linestyles=poly_line_types,
+                zorder=1,
+            )
+        )
+    if line_verts:
+        ax.add_collection(
+            LineCollection(
+                line_verts,
+                colors=line_colors,
+                linewidths=line_weights,
+                linestyles=line_types,
+                zorder=2,
             )
+        )
 
     plt.axis("scaled")
     if size: